@@ -1,8 +1,25 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify
+from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify, Response, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event, func, insert, inspect, select, text, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import raiseload, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.pool import QueuePool
 from flask_cors import CORS
+from flask_caching import Cache
 from dotenv import load_dotenv
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerificationError
+import asyncio
+import click
+import hashlib
+import hmac
+import httpx
+import json
 import os
+import queue
+import re
+import threading
 from google import genai  # Gemini API client
 
 # ------------------- Setup -------------------
@@ -15,7 +32,28 @@ app = Flask(__name__)
 app.secret_key = FLASK_SECRET_KEY
 app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///users.db"
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+# Pooled connections are reused across requests and threads, so users.db is
+# opened once per pooled connection instead of once per request
+SQLITE_CONNECT_ARGS = {"check_same_thread": False, "timeout": 5.0}
+app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+    "poolclass": QueuePool,
+    "pool_size": 5,
+    "max_overflow": 10,
+    "connect_args": SQLITE_CONNECT_ARGS,
+}
+# Read-only pool for pure-read queries, so they never queue behind the writer
+app.config["SQLALCHEMY_BINDS"] = {
+    "ro": {
+        "url": "sqlite:///file:users.db?mode=ro&uri=true",
+        "poolclass": QueuePool,
+        "pool_size": os.cpu_count(),
+        "max_overflow": 10,
+        "connect_args": SQLITE_CONNECT_ARGS,
+    }
+}
 db = SQLAlchemy(app)
+ph = PasswordHasher()  # argon2id
+cache = Cache(app, config={"CACHE_TYPE": "SimpleCache"})
 CORS(app)
 
 # ------------------- Models -------------------
@@ -29,58 +67,440 @@ class User(db.Model):
     is_admin = db.Column(db.Boolean, default=False)  # Admin flag
     sessions = db.relationship(
         "ChatSession",
-        backref="user",
+        back_populates="user",
         lazy=True,
         cascade="all, delete-orphan"
     )
 
 class ChatSession(db.Model):
+    __table_args__ = (db.Index("ix_chat_session_user_ts", "user_id", "timestamp"),)
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
     summary = db.Column(db.String(200), default="New Chat")
     timestamp = db.Column(db.DateTime, default=db.func.now())
+    # Rolling "User: ...\nBot: ...\n" transcript sent as the prompt prefix.
+    # NULL for sessions that predate it; deferred so listing sessions skips it.
+    context_cache = db.deferred(db.Column(db.Text, default=""), group="context")
+    # Gemini-written summary of the turns trimmed off context_cache
+    # (same group: build_prompt reads all three, so they load in one SELECT)
+    summary_context = db.deferred(db.Column(db.Text), group="context")
+    # Trimmed turns not folded into summary_context yet, appended in SQL like context_cache
+    pending_context = db.deferred(db.Column(db.Text), group="context")
 
-    chats = db.relationship("Chat", backref="session", lazy=True, cascade="all, delete-orphan")
+    user = db.relationship("User", back_populates="sessions")
+    chats = db.relationship("Chat", back_populates="session", lazy=True, cascade="all, delete-orphan")
 
 
 
 class Chat(db.Model):
+    __table_args__ = (db.Index("ix_chat_session_ts", "session_id", "timestamp"),)
+
     id = db.Column(db.Integer, primary_key=True)
     session_id = db.Column(db.Integer, db.ForeignKey("chat_session.id"), nullable=False)
     question = db.Column(db.Text, nullable=False)
     answer = db.Column(db.Text, nullable=False)
     timestamp = db.Column(db.DateTime, default=db.func.now())
 
+    session = db.relationship("ChatSession", back_populates="chats")
+
+# ------------------- SQLite Tuning -------------------
+# WAL lets readers run alongside the writer, and synchronous=NORMAL drops the
+# extra fsync per commit that the default rollback journal needs. Switching to
+# WAL writes to the file, so these only run on the read-write engine.
+SQLITE_WRITER_PRAGMAS = (
+    "journal_mode=WAL",
+    "synchronous=NORMAL",
+)
+# Per-connection settings, safe on the read-only engine too
+SQLITE_PRAGMAS = (
+    "busy_timeout=5000",
+    "cache_size=-20000",
+    "temp_store=memory",
+    "foreign_keys=ON",
+)
+
+def _run_pragmas(dbapi_conn, pragmas):
+    cursor = dbapi_conn.cursor()
+    for pragma in pragmas:
+        cursor.execute(f"PRAGMA {pragma}")
+    cursor.close()
+
+def set_sqlite_pragmas(dbapi_conn, connection_record):
+    _run_pragmas(dbapi_conn, SQLITE_PRAGMAS)
+
+def set_sqlite_writer_pragmas(dbapi_conn, connection_record):
+    _run_pragmas(dbapi_conn, SQLITE_WRITER_PRAGMAS + SQLITE_PRAGMAS)
+
+def upgrade_schema():
+    # create_all() never alters existing tables, so add new columns and indexes in place
+    inspector = inspect(db.engine)
+    for table in db.metadata.sorted_tables:
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing:
+                column_type = column.type.compile(db.engine.dialect)
+                db.session.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}'))
+    db.session.commit()
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
+
 with app.app_context():
+    # Engines connect lazily, so this opens nothing; every connection they make is tuned
+    for bind_key, engine in db.engines.items():
+        listener = set_sqlite_writer_pragmas if bind_key is None else set_sqlite_pragmas
+        event.listen(engine, "connect", listener)
+
+@app.cli.command("init-db")
+def init_db():
+    """Create or upgrade the tables and make sure the admin user exists."""
     db.create_all()
+    upgrade_schema()
     # Ensure admin user exists
     admin_user = User.query.filter_by(email="admin@barplexity.com").first()
     if not admin_user:
         admin_user = User(
             name="Admin",
             email="admin@barplexity.com",
-            password="12345678",  # Change or hash in production
+            password=ph.hash("12345678"),  # Change in production
             is_admin=True
         )
         db.session.add(admin_user)
         db.session.commit()
+    click.echo("Database initialized.")
 
 # ------------------- Gemini API -------------------
-client = genai.Client(api_key=GEMINI_API_KEY)
+# One pooled HTTP/2 transport for all async calls, so concurrent requests share
+# kept-alive connections instead of each paying a TCP + TLS handshake. Passing a
+# transport also makes the SDK use httpx rather than aiohttp.
+gemini_transport = httpx.AsyncHTTPTransport(
+    http2=True,
+    retries=2,
+    limits=httpx.Limits(max_connections=64, max_keepalive_connections=32),
+)
+client = genai.Client(
+    api_key=GEMINI_API_KEY,
+    http_options={"async_client_args": {"transport": gemini_transport}},
+)
+
+# Gemini allows ~500 requests per minute, so keep at most 500/60 calls in flight.
+GEMINI_MAX_CONCURRENCY = 500 // 60
+
+# Every Gemini call runs on one background event loop. Flask gives each async
+# view a fresh loop, so this is what lets the async client's connection pool
+# and the concurrency limit be shared between requests.
+gemini_loop = asyncio.new_event_loop()
+threading.Thread(target=gemini_loop.run_forever, daemon=True).start()
+gemini_semaphore = asyncio.Semaphore(GEMINI_MAX_CONCURRENCY)
+
+# Replies are cached by a hash of the full prompt, so an identical prompt is
+# answered without calling Gemini again.
+GEMINI_CACHE_TIMEOUT = 3600
+
+def _prompt_cache_key(prompt):
+    return "gemini:" + hashlib.blake2b(prompt.encode()).hexdigest()
+
+async def _generate_content(prompt):
+    key = _prompt_cache_key(prompt)
+    reply = cache.get(key)
+    if reply is not None:
+        return reply
+
+    async with gemini_semaphore:
+        response = await client.aio.models.generate_content(model=GEMINI_MODEL, contents=prompt)
+    cache.set(key, response.text, timeout=GEMINI_CACHE_TIMEOUT)
+    return response.text
+
+async def query_gemini_api_async(prompt):
+    try:
+        future = asyncio.run_coroutine_threadsafe(_generate_content(prompt), gemini_loop)
+        return await asyncio.wrap_future(future)
+    except Exception as e:
+        return f"Error: {e}"
 
 def query_gemini_api(prompt):
+    # Blocking wrapper for the form-POST chatbot route
     try:
-        response = client.models.generate_content(model=GEMINI_MODEL, contents=prompt)
-        return response.text
+        return asyncio.run_coroutine_threadsafe(_generate_content(prompt), gemini_loop).result()
     except Exception as e:
         return f"Error: {e}"
 
+async def _stream_content(prompt, chunks):
+    try:
+        async with gemini_semaphore:
+            stream = await client.aio.models.generate_content_stream(model=GEMINI_MODEL, contents=prompt)
+            async for chunk in stream:
+                if chunk.text:
+                    chunks.put(chunk.text)
+    finally:
+        chunks.put(None)
+
+def stream_gemini_api(prompt):
+    # Yields reply text as Gemini produces it; raises if the call fails
+    key = _prompt_cache_key(prompt)
+    reply = cache.get(key)
+    if reply is not None:
+        yield reply
+        return
+
+    chunks = queue.Queue()
+    future = asyncio.run_coroutine_threadsafe(_stream_content(prompt, chunks), gemini_loop)
+    parts = []
+    try:
+        while (chunk := chunks.get()) is not None:
+            parts.append(chunk)
+            yield chunk
+        future.result()
+    finally:
+        future.cancel()  # no-op once finished; stops the Gemini stream if closed early
+    cache.set(key, "".join(parts), timeout=GEMINI_CACHE_TIMEOUT)
+
+# Several prompts share one request as "### Q<n>" sections and are answered as
+# "### A<n>" sections; past ~8 per request the saving flattens out.
+GEMINI_BATCH_SIZE = 8
+
+def _batch_prompt(prompts):
+    header = (
+        "Answer each question below independently. For every question write a section "
+        "starting with its marker line ### A<n> (### A1, ### A2, ...), in order, "
+        "and write nothing before ### A1.\n\n"
+    )
+    # prompts may hold user text; collapse "###" runs so it cannot fake a marker
+    return header + "".join(f"### Q{i}\n{re.sub(r'#{3,}', '#', p)}\n" for i, p in enumerate(prompts, 1))
+
+def _parse_batch_reply(text, count):
+    parts = re.split(r"^\s*###\s*A(\d+)\b[:.]?", text, flags=re.MULTILINE)
+    answers = {int(n): answer.strip() for n, answer in zip(parts[1::2], parts[2::2])}
+    return [answers.get(i, "Error: answer missing from batch reply") for i in range(1, count + 1)]
+
+async def _generate_batches(prompts):
+    batches = [prompts[i:i + GEMINI_BATCH_SIZE] for i in range(0, len(prompts), GEMINI_BATCH_SIZE)]
+    replies = await asyncio.gather(
+        *(_generate_content(_batch_prompt(batch)) for batch in batches),
+        return_exceptions=True
+    )
+    answers = []
+    for batch, reply in zip(batches, replies):
+        if isinstance(reply, Exception):
+            answers.extend([f"Error: {reply}"] * len(batch))
+        else:
+            answers.extend(_parse_batch_reply(reply, len(batch)))
+    return answers
+
+def query_gemini_batch(prompts):
+    # One answer per prompt, in order; batches of GEMINI_BATCH_SIZE run in parallel
+    if not prompts:
+        return []
+    return asyncio.run_coroutine_threadsafe(_generate_batches(prompts), gemini_loop).result()
+
+# ------------------- Conversation Context -------------------
+# Once the transcript passes CONTEXT_MAX_CHARS (~8k tokens) it is cut back to
+# CONTEXT_TRIM_CHARS, so the older turns are summarized every few turns, not every turn
+CONTEXT_MAX_CHARS = 32000
+CONTEXT_TRIM_CHARS = 16000
+# Sessions without a context_cache rebuild it from at most this many recent turns
+CONTEXT_BACKFILL_TURNS = 20
+
+def split_context(context, max_chars):
+    # (older turns, newest turns within max_chars), split at a turn boundary;
+    # a single turn longer than max_chars is kept whole
+    if len(context) <= max_chars:
+        return "", context
+    start = context.find("\nUser: ", len(context) - max_chars)
+    if start == -1:
+        start = context.rfind("\nUser: ")
+    return context[:start + 1], context[start + 1:]
+
+def _load_summary_state(session_id):
+    with app.app_context():
+        return db.session.execute(
+            select(ChatSession.summary_context, ChatSession.pending_context).where(ChatSession.id == session_id)
+        ).one_or_none()
+
+def _save_summary_context(session_id, previous_summary, folded, summary):
+    with app.app_context():
+        # drop only the folded text: turns trimmed meanwhile stay pending; the
+        # summary check skips the write if another worker folded first
+        db.session.execute(
+            update(ChatSession)
+            .where(ChatSession.id == session_id, ChatSession.summary_context.is_not_distinct_from(previous_summary))
+            .values(summary_context=summary, pending_context=func.substr(ChatSession.pending_context, len(folded) + 1)),
+            execution_options={"synchronize_session": False}
+        )
+        db.session.commit()
+
+async def _summarize_turns(session_id):
+    # reads the current summary and pending turns here rather than at trim time,
+    # so each run builds on the last saved summary
+    state = await asyncio.to_thread(_load_summary_state, session_id)
+    if not state or not state.pending_context:
+        return
+    prompt = (
+        "Summarize this conversation in a short paragraph, keeping names, facts and "
+        "decisions the assistant may need later.\n\n"
+        + (f"Summary so far: {state.summary_context}\n\n" if state.summary_context else "")
+        + state.pending_context
+    )
+    new_summary = await _generate_content(prompt)
+    if new_summary:
+        await asyncio.to_thread(
+            _save_summary_context, session_id, state.summary_context, state.pending_context, new_summary
+        )
+
+# session id -> newest summary task queued for it; only touched on gemini_loop
+_summary_tasks = {}
+
+async def _summarize_in_order(session_id):
+    # One summary run per session at a time; a run that finds nothing pending
+    # (an earlier one folded it) returns without calling Gemini
+    previous = _summary_tasks.get(session_id)
+    task = _summary_tasks[session_id] = asyncio.current_task()
+    try:
+        if previous:
+            await asyncio.wait([previous])
+        await _summarize_turns(session_id)
+    except Exception:
+        # the turns stay in pending_context and are folded by the next run
+        app.logger.exception("Summarizing chat session %s failed", session_id)
+    finally:
+        if _summary_tasks.get(session_id) is task:
+            del _summary_tasks[session_id]
+
+@event.listens_for(db.session, "after_commit")
+def dispatch_summaries(db_session):
+    # only once the trim is committed; runs on the Gemini loop, the reply does not wait
+    for session_id in db_session.info.pop("summarize", ()):
+        asyncio.run_coroutine_threadsafe(_summarize_in_order(session_id), gemini_loop)
+
+@event.listens_for(db.session, "after_rollback")
+def drop_summaries(db_session):
+    db_session.info.pop("summarize", None)
+
+def build_prompt(chat_session, user_message):
+    if chat_session.context_cache is None:
+        recent_chats = (
+            Chat.query.filter_by(session_id=chat_session.id)
+            .order_by(Chat.timestamp.desc())
+            .limit(CONTEXT_BACKFILL_TURNS)
+            .all()
+        )
+        transcript = "".join(f"User: {chat.question}\nBot: {chat.answer}\n" for chat in reversed(recent_chats))
+        # not marked dirty; record_turn() stores it only if the column is still NULL
+        set_committed_value(chat_session, "context_cache", split_context(transcript, CONTEXT_MAX_CHARS)[1])
+
+    # turns waiting to be summarized are still sent, newest first if there are many
+    pending = split_context(chat_session.pending_context or "", CONTEXT_TRIM_CHARS)[1]
+    prompt = pending + chat_session.context_cache + f"User: {user_message}\nBot:"
+    if chat_session.summary_context:
+        prompt = f"Summary of the earlier conversation: {chat_session.summary_context}\n" + prompt
+    return prompt
+
+def record_turn(chat_session, user_message, bot_reply):
+    # plain INSERT, no Chat object in the identity map; the caller commits it
+    # together with the session's context (and summary) update
+    db.session.execute(
+        insert(Chat),
+        [{"session_id": chat_session.id, "question": user_message, "answer": bot_reply}]
+    )
+
+    # Append in SQL rather than writing back the value read before the Gemini call,
+    # so two turns in flight for one session cannot drop each other. The UPDATE
+    # holds SQLite's write lock until commit, which also covers the trim below.
+    turn = f"User: {user_message}\nBot: {bot_reply}\n"
+    context = db.session.execute(
+        update(ChatSession)
+        .where(ChatSession.id == chat_session.id)
+        .values(context_cache=func.coalesce(ChatSession.context_cache, chat_session.context_cache) + turn)
+        .returning(ChatSession.context_cache),
+        execution_options={"synchronize_session": False}
+    ).scalar_one()
+
+    if len(context) > CONTEXT_MAX_CHARS:
+        trimmed, context = split_context(context, CONTEXT_TRIM_CHARS)
+        if trimmed:
+            db.session.execute(
+                update(ChatSession)
+                .where(ChatSession.id == chat_session.id)
+                .values(
+                    context_cache=context,
+                    pending_context=func.coalesce(ChatSession.pending_context, "") + trimmed
+                ),
+                execution_options={"synchronize_session": False}
+            )
+            # summarized by dispatch_summaries() once the caller commits
+            db.session.info.setdefault("summarize", set()).add(chat_session.id)
+    set_committed_value(chat_session, "context_cache", context)
+
+# ------------------- Query Helpers -------------------
+def read_only(statement):
+    # Run a SELECT on the "ro" bind instead of the read-write pool
+    return db.session.execute(statement, bind_arguments={"bind": db.engines["ro"]})
+
+def first_questions(*criteria):
+    # Subquery of every chat in the sessions matching `criteria`, numbered per
+    # session by (timestamp, id); rn == 1 is the session's first question
+    return (
+        select(
+            Chat.session_id,
+            Chat.question,
+            func.row_number().over(
+                partition_by=Chat.session_id,
+                order_by=(Chat.timestamp, Chat.id)
+            ).label("rn")
+        )
+        .join(ChatSession)
+        .where(*criteria)
+        .subquery()
+    )
+
+def eager(*loaders):
+    # In debug, relationships not loaded by `loaders` raise instead of lazy loading
+    if app.debug:
+        return (*loaders, raiseload("*"))
+    return loaders
+
+def session_user_blocked():
+    # One-column lookup, run only before Gemini calls: page views trust the session,
+    # but a user blocked or deleted since login cannot send another message
+    is_blocked = db.session.execute(select(User.is_blocked).where(User.id == session["user_id"])).scalar()
+    return is_blocked is None or is_blocked
+
+# ------------------- Passwords -------------------
+def check_password(user, password):
+    if not password:
+        return False
+
+    # accounts from before hashing store plaintext; hash it on the first good login
+    if not user.password.startswith("$argon2"):
+        if not hmac.compare_digest(user.password.encode(), password.encode()):
+            return False
+        user.password = ph.hash(password)
+        db.session.commit()
+        return True
+
+    try:
+        ph.verify(user.password, password)
+    except (VerificationError, InvalidHashError):
+        return False
+    if ph.check_needs_rehash(user.password):
+        user.password = ph.hash(password)
+        db.session.commit()
+    return True
+
 # ------------------- Routes -------------------
+# The landing and login pages only vary by flashed messages and login state, both
+# kept in the session, so they are cached for visitors with an empty session
+def has_session_state():
+    return bool(session)
+
 @app.route("/")
+@cache.cached(timeout=3600, unless=has_session_state)
 def home():
     return render_template("barplexity.html")
 
 @app.route("/login_page")
+@cache.cached(timeout=3600, unless=has_session_state)
 def login_page():
     return render_template("login.html")
 
@@ -98,7 +518,7 @@ def signup():
         flash("Email already registered!", "error")
         return redirect(url_for("login_page"))
 
-    new_user = User(name=name, email=email, password=password)
+    new_user = User(name=name, email=email, password=ph.hash(password))
     db.session.add(new_user)
     db.session.commit()
 
@@ -123,9 +543,10 @@ def signin():
         flash("You are blocked. Contact admin.", "error")
         return redirect(url_for("login_page"))
 
-    if user.password == password:
+    if check_password(user, password):
         session["user_id"] = user.id
         session["user"] = user.name
+        session["is_admin"] = user.is_admin  # lets admin routes skip the user lookup
         if user.is_admin:
             return redirect(url_for("admin_dashboard"))
         else:
@@ -137,16 +558,14 @@ def signin():
 # ------------------- Admin Routes -------------------
 @app.route("/admin")
 def admin_dashboard():
-    if "user_id" not in session:
+    if not session.get("is_admin"):
         flash("Access denied!", "error")
         return redirect(url_for("home"))
 
-    user = User.query.get(session["user_id"])
-    if not user or not user.is_admin:
-        flash("Access denied!", "error")
-        return redirect(url_for("home"))
-
-    users = User.query.filter(User.email != "admin@barplexity.com").all()
+    # admin.html gets ORM users: in debug, touching a relationship there raises
+    users = read_only(
+        select(User).options(*eager()).filter(User.email != "admin@barplexity.com")
+    ).scalars().all()
     return render_template("admin.html", users=users)
 
 @app.route("/admin/block/<int:user_id>")
@@ -160,7 +579,10 @@ def block_user(user_id):
 
 @app.route("/admin/delete/<int:user_id>")
 def delete_user(user_id):
-    user = User.query.get(user_id)
+    # load what the cascade deletes up front: two SELECTs however many sessions/chats
+    user = User.query.options(
+        *eager(selectinload(User.sessions).selectinload(ChatSession.chats))
+    ).get(user_id)
     if user:
         user.is_banned = True  # Ban future login
         db.session.delete(user)  # cascades to sessions and chats
@@ -168,62 +590,147 @@ def delete_user(user_id):
         flash(f"{user.name} has been deleted and banned!", "success")
     return redirect(url_for("admin_dashboard"))
 
+def requested_user_ids(data):
+    # {"ids": [1, 2, ...]} -> [1, 2, ...]; None for anything else (bools are not ids)
+    ids = data.get("ids") if isinstance(data, dict) else None
+    if isinstance(ids, list) and all(type(user_id) is int for user_id in ids):
+        return ids
+    return None
+
+@app.route("/admin/block", methods=["POST"])
+def block_users():
+    if not session.get("is_admin"):
+        return {"status": "error", "msg": "Unauthorized"}, 403
+
+    data = request.get_json(silent=True)
+    user_ids = requested_user_ids(data)
+    blocked = data.get("blocked", True) if user_ids is not None else None
+    if not isinstance(blocked, bool):
+        return {"status": "error", "msg": 'Expected {"ids": [<int>, ...], "blocked": true|false}'}, 400
+
+    count = (
+        User.query.filter(User.id.in_(user_ids), User.is_admin.is_(False))
+        .update({"is_blocked": blocked}, synchronize_session=False)
+    )
+    db.session.commit()
+    return {"status": "success", "count": count}, 200
+
+@app.route("/admin/delete", methods=["POST"])
+def delete_users():
+    if not session.get("is_admin"):
+        return {"status": "error", "msg": "Unauthorized"}, 403
+
+    ids = requested_user_ids(request.get_json(silent=True))
+    if ids is None:
+        return {"status": "error", "msg": 'Expected {"ids": [<int>, ...]}'}, 400
+
+    user_ids = select(User.id).where(User.id.in_(ids), User.is_admin.is_(False))
+    session_ids = select(ChatSession.id).where(ChatSession.user_id.in_(user_ids))
+    # bulk deletes skip the ORM cascade, so remove chats and sessions first
+    Chat.query.filter(Chat.session_id.in_(session_ids)).delete(synchronize_session=False)
+    ChatSession.query.filter(ChatSession.user_id.in_(user_ids)).delete(synchronize_session=False)
+    count = User.query.filter(User.id.in_(user_ids)).delete(synchronize_session=False)
+    db.session.commit()
+    return {"status": "success", "count": count}, 200
+
+# Each summarize run titles at most this many sessions (4 parallel Gemini batches)
+SUMMARIZE_SESSIONS_PER_RUN = 4 * GEMINI_BATCH_SIZE
+
+@app.route("/admin/summarize", methods=["POST"])
+def summarize_sessions():
+    if not session.get("is_admin"):
+        flash("Access denied!", "error")
+        return redirect(url_for("home"))
+
+    # oldest untitled sessions that have messages, with their first question
+    firsts = first_questions(ChatSession.summary == "New Chat")
+    pending = (
+        db.session.execute(
+            select(firsts.c.session_id, firsts.c.question)
+            .where(firsts.c.rn == 1)
+            .order_by(firsts.c.session_id)
+            .limit(SUMMARIZE_SESSIONS_PER_RUN)
+        ).all()
+    )
+    prompts = [
+        f"Give a short title (at most 8 words) for a chat that starts with: {row.question}"
+        for row in pending
+    ]
+    titles = [
+        {"id": row.session_id, "summary": title[:200]}
+        for row, title in zip(pending, query_gemini_batch(prompts))
+        if title and not title.startswith("Error:")
+    ]
+    if titles:
+        # executemany UPDATE by primary key; skips sessions titled in the meantime
+        db.session.execute(
+            update(ChatSession).where(ChatSession.summary == "New Chat"),
+            titles,
+            execution_options={"synchronize_session": None}
+        )
+    db.session.commit()
+
+    flash(f"{len(titles)} chat sessions have been summarized!", "success")
+    return redirect(url_for("admin_dashboard"))
+
 # ------------------- Chatbot Routes -------------------
 @app.route("/chatbot", methods=["GET", "POST"])
 def chatbot():
     if "user" not in session:
         return redirect(url_for("home"))
 
-    user = User.query.get(session["user_id"])
-    if not user:
-        session.clear()
-        return redirect(url_for("home"))
-
-    # fetch sessions but only those which have messages
-    sessions_with_msgs = (
-        ChatSession.query.filter_by(user_id=user.id)
-        .join(Chat)
-        .group_by(ChatSession.id)
-        .order_by(ChatSession.timestamp.desc())
-        .all()
-    )
+    user_id = session["user_id"]
 
-    # summaries for sidebar
-    summaries = []
-    for s in sessions_with_msgs:
-        first_msg = s.chats[0].question[:30] if s.chats else "New Chat"
-        summaries.append({"id": s.id, "summary": first_msg})
+    # summaries for sidebar: first question of each session that has messages, in one query
+    firsts = first_questions(ChatSession.user_id == user_id)
+    rows = read_only(
+        select(ChatSession.id, func.substr(firsts.c.question, 1, 30).label("summary"))
+        .join(firsts, firsts.c.session_id == ChatSession.id)
+        .where(firsts.c.rn == 1)
+        .order_by(ChatSession.timestamp.desc(), ChatSession.id.desc())
+    ).all()
+    summaries = [{"id": row.id, "summary": row.summary} for row in rows]
 
     # current session
     session_id = request.args.get("session_id")
     if session_id:
         current_session = ChatSession.query.get(int(session_id))
+        if not current_session or current_session.user_id != user_id:
+            return redirect(url_for("chatbot"))
     else:
-        current_session = ChatSession(user_id=user.id)
+        current_session = ChatSession(user_id=user_id)
         db.session.add(current_session)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # the user was deleted since login (foreign_keys=ON rejects the session)
+            db.session.rollback()
+            session.clear()
+            return redirect(url_for("home"))
 
     # Handle user message
     if request.method == "POST":
-        user_message = request.form.get("message")
-        # Build full conversation
-        previous_chats = Chat.query.filter_by(session_id=current_session.id).order_by(Chat.timestamp.asc()).all()
-        prompt = ""
-        for chat in previous_chats:
-            prompt += f"User: {chat.question}\nBot: {chat.answer}\n"
-        prompt += f"User: {user_message}\nBot:"
+        if session_user_blocked():
+            session.clear()
+            flash("You are blocked. Contact admin.", "error")
+            return redirect(url_for("login_page"))
 
+        user_message = request.form.get("message")
+        prompt = build_prompt(current_session, user_message)
         bot_reply = query_gemini_api(prompt)
-
-        chat_msg = Chat(session_id=current_session.id, question=user_message, answer=bot_reply)
-        db.session.add(chat_msg)
+        record_turn(current_session, user_message, bot_reply)
 
         if current_session.summary == "New Chat":
             current_session.summary = user_message[:50]
 
         db.session.commit()
 
-    messages = Chat.query.filter_by(session_id=current_session.id).order_by(Chat.timestamp.asc()).all()
+    # plain rows for rendering; no ORM objects are built for the history
+    messages = db.session.execute(
+        select(Chat.question, Chat.answer, Chat.timestamp)
+        .where(Chat.session_id == current_session.id)
+        .order_by(Chat.timestamp.asc())
+    ).all()
 
     return render_template(
         "chatbot.html",
@@ -234,37 +741,78 @@ def chatbot():
     )
 
 @app.route("/chatbot-api", methods=["POST"])
-def chatbot_api():
+async def chatbot_api():
     if "user" not in session:
         return jsonify({"reply": "Please login first!"})
 
+    if session_user_blocked():
+        session.clear()
+        return jsonify({"reply": "You are blocked. Contact admin."})
+
     data = request.get_json()
     user_message = data.get("message")
     session_id = data.get("session_id")
 
-    chat_session = ChatSession.query.get(session_id)
-    if not chat_session:
+    chat_session = ChatSession.query.get(session_id) if session_id is not None else None
+    if not chat_session or chat_session.user_id != session["user_id"]:
         return jsonify({"reply": "Chat session not found!"})
 
-    previous_chats = Chat.query.filter_by(session_id=chat_session.id).order_by(Chat.timestamp.asc()).all()
-    prompt = ""
-    for chat in previous_chats:
-        prompt += f"User: {chat.question}\nBot: {chat.answer}\n"
-    prompt += f"User: {user_message}\nBot:"
-
-    bot_reply = query_gemini_api(prompt)
-    chat_msg = Chat(session_id=chat_session.id, question=user_message, answer=bot_reply)
-    db.session.add(chat_msg)
+    prompt = build_prompt(chat_session, user_message)
+    bot_reply = await query_gemini_api_async(prompt)
+    record_turn(chat_session, user_message, bot_reply)
     db.session.commit()
 
     return jsonify({"reply": bot_reply})
 
+def sse(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+@app.route("/chatbot-stream")
+def chatbot_stream():
+    # Server-sent events for EventSource: "chunk" events carry reply text as it is
+    # generated, then one "done" or "error" event; close the EventSource on either
+    if "user" not in session:
+        return Response(sse("error", {"reply": "Please login first!"}), mimetype="text/event-stream")
+
+    if session_user_blocked():
+        session.clear()
+        return Response(sse("error", {"reply": "You are blocked. Contact admin."}), mimetype="text/event-stream")
+
+    user_message = request.args.get("message")
+    session_id = request.args.get("session_id", type=int)
+    chat_session = ChatSession.query.get(session_id) if session_id is not None else None
+    if not user_message or not chat_session or chat_session.user_id != session["user_id"]:
+        return Response(sse("error", {"reply": "Chat session not found!"}), mimetype="text/event-stream")
+
+    prompt = build_prompt(chat_session, user_message)
+
+    def generate():
+        parts = []
+        bot_reply = None
+        stream = stream_gemini_api(prompt)
+        try:
+            for chunk in stream:
+                parts.append(chunk)
+                yield sse("chunk", {"text": chunk})
+            bot_reply = "".join(parts)
+        except Exception as e:
+            bot_reply = f"Error: {e}"
+        finally:
+            # also runs when the client disconnects mid-reply (the server closes
+            # this generator): keep the part of the reply streamed so far
+            stream.close()
+            record_turn(chat_session, user_message, "".join(parts) if bot_reply is None else bot_reply)
+            db.session.commit()
+        yield sse("error" if bot_reply.startswith("Error:") else "done", {"reply": bot_reply})
+
+    return Response(stream_with_context(generate()), mimetype="text/event-stream")
+
 @app.route("/delete-chat/<int:session_id>", methods=["DELETE"])
 def delete_chat(session_id):
     if "user" not in session:
         return {"status": "error", "msg": "Unauthorized"}, 403
 
-    chat_session = ChatSession.query.get(session_id)
+    chat_session = ChatSession.query.options(*eager(selectinload(ChatSession.chats))).get(session_id)
     if chat_session and chat_session.user_id == session["user_id"]:
         db.session.delete(chat_session)
         db.session.commit()
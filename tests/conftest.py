@@ -0,0 +1,120 @@
+import os
+import sys
+from contextlib import contextmanager
+
+import pytest
+from flask import Flask
+from jinja2 import DictLoader
+from sqlalchemy import event
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault("FLASK_SECRET_KEY", "test")
+os.environ.setdefault("gemini_api_key", "test")
+
+# Minimal stand-ins for the real templates: just enough output to assert on
+TEMPLATES = {
+    "barplexity.html": "home",
+    "login.html": "login",
+    "admin.html": "{% for u in users %}{{ u.id }}:{{ u.name }}:{{ u.is_blocked }};{% endfor %}",
+    "chatbot.html": (
+        "{% for s in sessions %}[{{ s.id }}:{{ s.summary }}]{% endfor %}"
+        "|{{ selected_session }}|"
+        "{% for m in messages %}<{{ m.question }}={{ m.answer }}>{% endfor %}"
+    ),
+}
+
+
+@pytest.fixture(scope="session")
+def app(tmp_path_factory):
+    # users.db lives in the instance folder; point it at a temp dir before main builds its engines
+    instance_path = str(tmp_path_factory.mktemp("instance"))
+    patch = pytest.MonkeyPatch()
+    patch.setattr(Flask, "auto_find_instance_path", lambda self: instance_path)
+    import main
+    patch.undo()
+
+    main.app.config["TESTING"] = True
+    main.app.jinja_env.loader = DictLoader(TEMPLATES)
+    return main.app
+
+
+@pytest.fixture
+def main(app):
+    import main
+
+    return main
+
+
+@pytest.fixture(autouse=True)
+def database(app, main):
+    main.cache.clear()  # cached Gemini replies would outlive the tables
+    with app.app_context():
+        main.db.drop_all()
+    result = app.test_cli_runner().invoke(args=["init-db"])
+    assert result.exit_code == 0, result.output
+    yield
+    with app.app_context():
+        main.db.session.remove()
+
+
+@pytest.fixture(autouse=True)
+def gemini(main, monkeypatch):
+    prompts = []
+
+    async def fake_generate_content(prompt):
+        prompts.append(prompt)
+        return f"reply{len(prompts)}"
+
+    monkeypatch.setattr(main, "_generate_content", fake_generate_content)
+    return prompts
+
+
+@pytest.fixture
+def debug(app):
+    # eager() only adds raiseload("*") in debug
+    app.debug = True
+    yield
+    app.debug = False
+
+
+@pytest.fixture
+def count_queries(app, main):
+    """Record every statement sent to either engine inside the ``with`` block."""
+
+    @contextmanager
+    def counter():
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        with app.app_context():
+            engines = list(main.db.engines.values())
+        for engine in engines:
+            event.listen(engine, "before_cursor_execute", record)
+        try:
+            yield statements
+        finally:
+            for engine in engines:
+                event.remove(engine, "before_cursor_execute", record)
+
+    return counter
+
+
+@pytest.fixture
+def login(app):
+    def login(email, password="password", name=None):
+        client = app.test_client()
+        if name:
+            client.post("/signup", data={"name": name, "email": email, "password": password})
+        response = client.post("/signin", data={"email": email, "password": password})
+        assert response.status_code == 302, response.data
+        return client
+
+    return login
+
+
+@pytest.fixture
+def admin(login):
+    return login("admin@barplexity.com", "12345678")
@@ -0,0 +1,66 @@
+import pytest
+
+
+def user_ids(app, main):
+    with app.app_context():
+        return [user.id for user in main.User.query.filter(main.User.is_admin.is_(False)).order_by(main.User.id)]
+
+
+@pytest.fixture
+def users(app, main, login):
+    for i in range(3):
+        login(f"user{i}@example.com", name=f"user{i}")
+    return user_ids(app, main)
+
+
+@pytest.mark.parametrize("body", [
+    {"ids": 5},
+    {"ids": "12"},
+    {"ids": ["12"]},
+    {"ids": [True]},
+    {"ids": [1.5]},
+    {"blocked": True},
+    [1, 2],
+    {"ids": [1], "blocked": "false"},
+    {"ids": [1], "blocked": 0},
+    {"ids": [1], "blocked": None},
+])
+def test_block_users_rejects_bad_body(admin, users, body):
+    response = admin.post("/admin/block", json=body)
+
+    assert response.status_code == 400
+    assert response.get_json()["status"] == "error"
+
+
+@pytest.mark.parametrize("body", [{"ids": 5}, {"ids": ["12"]}, {"ids": [False]}, [1, 2], "1", {}])
+def test_delete_users_rejects_bad_body(app, main, admin, users, body):
+    response = admin.post("/admin/delete", json=body)
+
+    assert response.status_code == 400
+    assert user_ids(app, main) == users
+
+
+def test_block_and_unblock_users(app, main, admin, users):
+    response = admin.post("/admin/block", json={"ids": users[:2], "blocked": True})
+    assert response.get_json() == {"status": "success", "count": 2}
+
+    response = admin.post("/admin/block", json={"ids": users[:1], "blocked": False})
+    assert response.get_json() == {"status": "success", "count": 1}
+
+    with app.app_context():
+        blocked = [user.is_blocked for user in main.User.query.filter(main.User.id.in_(users)).order_by(main.User.id)]
+    assert blocked == [False, True, False]
+
+
+def test_delete_users(app, main, admin, users):
+    response = admin.post("/admin/delete", json={"ids": users[1:]})
+
+    assert response.get_json() == {"status": "success", "count": 2}
+    assert user_ids(app, main) == users[:1]
+
+
+def test_batch_routes_need_admin(login, users):
+    client = login("user0@example.com")
+
+    assert client.post("/admin/block", json={"ids": users}).status_code == 403
+    assert client.post("/admin/delete", json={"ids": users}).status_code == 403
@@ -0,0 +1,143 @@
+import asyncio
+import re
+
+import pytest
+
+
+@pytest.fixture
+def small_context(main, monkeypatch):
+    monkeypatch.setattr(main, "CONTEXT_MAX_CHARS", 400)
+    monkeypatch.setattr(main, "CONTEXT_TRIM_CHARS", 200)
+
+
+@pytest.fixture
+def gemini(main, monkeypatch):
+    """Chat replies are 150 chars; summaries list every question they cover, in order."""
+    calls = {"chat": [], "summary": [], "summary_delay": 0, "summary_error": None}
+
+    async def fake_generate_content(prompt):
+        if not prompt.startswith("Summarize"):
+            calls["chat"].append(prompt)
+            return "r" * 150
+        calls["summary"].append(prompt)
+        await asyncio.sleep(calls["summary_delay"])
+        if calls["summary_error"]:
+            raise calls["summary_error"]
+        earlier = re.search(r"Summary so far: S\[(.*?)\]", prompt)
+        questions = ([earlier.group(1)] if earlier else []) + re.findall(r"^User: (q\d+)$", prompt, re.MULTILINE)
+        return f"S[{','.join(questions)}]"
+
+    monkeypatch.setattr(main, "_generate_content", fake_generate_content)
+    return calls
+
+
+def wait_for_summaries(main):
+    async def drain():
+        while main._summary_tasks:
+            await asyncio.wait(list(main._summary_tasks.values()))
+
+    asyncio.run_coroutine_threadsafe(drain(), main.gemini_loop).result(timeout=10)
+
+
+def context_state(app, main, session_id):
+    with app.app_context():
+        return main.db.session.execute(
+            main.select(main.ChatSession.summary_context, main.ChatSession.pending_context, main.ChatSession.context_cache)
+            .where(main.ChatSession.id == session_id)
+        ).one()
+
+
+def build_next_prompt(app, main, session_id):
+    with app.app_context():
+        return main.build_prompt(main.db.session.get(main.ChatSession, session_id), "next")
+
+
+@pytest.fixture
+def chat(login):
+    client = login("al@example.com", name="al")
+    session_id = int(client.get("/chatbot").get_data(as_text=True).split("|")[1])
+
+    def send(*messages):
+        for message in messages:
+            assert client.post("/chatbot-api", json={"message": message, "session_id": session_id}).status_code == 200
+
+    send.session_id = session_id
+    return send
+
+
+def test_prompt_carries_previous_turns(chat, gemini):
+    chat("q1", "q2")
+
+    assert gemini["chat"] == ["User: q1\nBot:", f"User: q1\nBot: {'r' * 150}\nUser: q2\nBot:"]
+
+
+def test_trim_at_turn_boundary(app, main, small_context, chat, gemini):
+    chat("q1", "q2")
+    assert not gemini["summary"]
+
+    chat("q3")  # three turns (~500 chars) pass CONTEXT_MAX_CHARS
+    wait_for_summaries(main)
+
+    state = context_state(app, main, chat.session_id)
+    assert state.context_cache == f"User: q3\nBot: {'r' * 150}\n"
+    assert state.summary_context == "S[q1,q2]"
+    assert state.pending_context == ""
+
+    chat("q4")
+    assert gemini["chat"][-1].startswith(f"Summary of the earlier conversation: S[q1,q2]\nUser: q3\nBot: ")
+
+
+def test_summary_carried_over(app, main, small_context, chat, gemini):
+    chat("q1", "q2", "q3")
+    wait_for_summaries(main)
+    chat("q4", "q5")
+    wait_for_summaries(main)
+
+    assert "Summary so far: S[q1,q2]" in gemini["summary"][-1]
+    assert context_state(app, main, chat.session_id).summary_context == "S[q1,q2,q3,q4]"
+
+
+def test_trims_while_summarizing_lose_nothing(app, main, small_context, chat, gemini):
+    gemini["summary_delay"] = 0.3
+    chat("q1", "q2", "q3")  # first trim; its summary is still running
+    chat("q4", "q5", "q6", "q7")  # more trims meanwhile
+
+    # not yet summarized turns are still in the prompt
+    assert "User: q4\n" in gemini["chat"][-1]
+
+    wait_for_summaries(main)
+    state = context_state(app, main, chat.session_id)
+    folded = state.summary_context[2:-1].split(",")
+    kept = re.findall(r"^User: (q\d+)$", state.pending_context + state.context_cache, re.MULTILINE)
+    assert folded + kept == ["q1", "q2", "q3", "q4", "q5", "q6", "q7"]
+
+
+def test_failed_summary_keeps_turns_pending(app, main, small_context, chat, gemini, caplog):
+    gemini["summary_error"] = RuntimeError("quota")
+    chat("q1", "q2", "q3")
+    wait_for_summaries(main)
+
+    state = context_state(app, main, chat.session_id)
+    assert state.summary_context is None
+    assert state.pending_context.startswith("User: q1\n")
+    assert "Summarizing chat session" in caplog.text
+    # pending turns stay in the prompt, newest CONTEXT_TRIM_CHARS of them
+    assert build_next_prompt(app, main, chat.session_id).startswith("User: q2\n")
+
+    gemini["summary_error"] = None
+    chat("q4", "q5")
+    wait_for_summaries(main)
+    assert context_state(app, main, chat.session_id).summary_context == "S[q1,q2,q3,q4]"
+
+
+def test_rolled_back_trim_is_not_summarized(app, main, small_context, chat, gemini):
+    chat("q1", "q2")
+    with app.app_context():
+        chat_session = main.db.session.get(main.ChatSession, chat.session_id)
+        main.build_prompt(chat_session, "q3")
+        main.record_turn(chat_session, "q3", "r" * 150)
+        main.db.session.rollback()
+    wait_for_summaries(main)
+
+    assert not gemini["summary"]
+    assert context_state(app, main, chat.session_id).pending_context is None
@@ -0,0 +1,100 @@
+import re
+
+import pytest
+from sqlalchemy.exc import InvalidRequestError
+
+
+def new_session(client):
+    response = client.get("/chatbot")
+    return int(re.search(r"\|(\d+)\|", response.get_data(as_text=True)).group(1))
+
+
+def add_sessions(client, count, turns=2):
+    session_ids = []
+    for i in range(count):
+        session_id = new_session(client)
+        for turn in range(turns):
+            client.post("/chatbot-api", json={"message": f"topic {i} turn {turn}", "session_id": session_id})
+        session_ids.append(session_id)
+    return session_ids
+
+
+@pytest.mark.parametrize("sessions", [1, 5])
+def test_chatbot_sidebar(login, count_queries, debug, sessions):
+    client = login("al@example.com", name="al")
+    session_id = add_sessions(client, sessions)[-1]
+
+    with count_queries() as statements:
+        response = client.get(f"/chatbot?session_id={session_id}")
+
+    page = response.get_data(as_text=True)
+    assert page.count("[") == sessions
+    assert page.count("<") == 2
+    # sidebar, current session, history: independent of the number of sessions
+    assert len(statements) == 3, statements
+
+
+def test_chatbot_post(login, count_queries, debug, gemini):
+    client = login("al@example.com", name="al")
+    session_id = add_sessions(client, 3)[-1]
+
+    with count_queries() as statements:
+        response = client.post(f"/chatbot?session_id={session_id}", data={"message": "again"})
+
+    assert "<again=reply" in response.get_data(as_text=True)
+    assert "again" in gemini[-1]
+    # sidebar, session, block check, context, INSERT, context append, summary, refresh, history
+    assert len(statements) == 9, statements
+
+
+def test_admin_dashboard(login, admin, count_queries, debug):
+    for i in range(5):
+        add_sessions(login(f"user{i}@example.com", name=f"user{i}"), 1)
+
+    with count_queries() as statements:
+        response = admin.get("/admin")
+
+    assert response.get_data(as_text=True).count(";") == 5
+    assert len(statements) == 1, statements
+
+
+@pytest.mark.parametrize("sessions", [1, 5])
+def test_delete_user_cascade(app, main, login, admin, count_queries, debug, sessions):
+    client = login("al@example.com", name="al")
+    add_sessions(client, sessions)
+    with app.app_context():
+        user_id = main.User.query.filter_by(email="al@example.com").one().id
+
+    with count_queries() as statements:
+        response = admin.get(f"/admin/delete/{user_id}")
+
+    assert response.status_code == 302
+    with app.app_context():
+        assert main.db.session.query(main.ChatSession).count() == 0
+        assert main.db.session.query(main.Chat).count() == 0
+    # user + sessions + chats SELECTs, then one executemany DELETE per table
+    selects = [s for s in statements if s.lstrip().upper().startswith("SELECT")]
+    assert len(selects) == 3, statements
+
+
+def test_delete_chat_cascade(app, main, login, count_queries, debug):
+    client = login("al@example.com", name="al")
+    keep, drop = add_sessions(client, 2, turns=3)
+
+    with count_queries() as statements:
+        response = client.delete(f"/delete-chat/{drop}")
+
+    assert response.status_code == 200
+    with app.app_context():
+        assert main.db.session.query(main.Chat.session_id).distinct().all() == [(keep,)]
+    selects = [s for s in statements if s.lstrip().upper().startswith("SELECT")]
+    assert len(selects) == 2, statements
+
+
+def test_template_lazy_load_raises_in_debug(app, login, admin, debug, monkeypatch):
+    login("al@example.com", name="al")
+    monkeypatch.setitem(app.jinja_env.loader.mapping, "admin.html", "{% for u in users %}{{ u.sessions }}{% endfor %}")
+    app.jinja_env.cache.clear()
+
+    with pytest.raises(InvalidRequestError, match="lazy='raise'"):
+        admin.get("/admin")
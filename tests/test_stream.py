@@ -0,0 +1,52 @@
+import asyncio
+
+import pytest
+
+
+@pytest.fixture
+def streamed(main, monkeypatch):
+    async def fake_stream_content(prompt, chunks):
+        try:
+            for text in ("one ", "two ", "three"):
+                chunks.put(text)
+                await asyncio.sleep(0)
+        finally:
+            chunks.put(None)
+
+    monkeypatch.setattr(main, "_stream_content", fake_stream_content)
+
+
+def history(client, session_id):
+    return client.get(f"/chatbot?session_id={session_id}").get_data(as_text=True)
+
+
+def test_stream_saves_turn(login, streamed):
+    client = login("al@example.com", name="al")
+    session_id = int(client.get("/chatbot").get_data(as_text=True).split("|")[1])
+
+    body = client.get(f"/chatbot-stream?session_id={session_id}&message=count").get_data(as_text=True)
+
+    assert body.count("event: chunk") == 3
+    assert 'event: done\ndata: {"reply": "one two three"}' in body
+    assert "<count=one two three>" in history(client, session_id)
+
+
+def test_stream_disconnect_saves_partial_turn(login, streamed):
+    client = login("al@example.com", name="al")
+    session_id = int(client.get("/chatbot").get_data(as_text=True).split("|")[1])
+
+    response = client.get(f"/chatbot-stream?session_id={session_id}&message=count", buffered=False)
+    first = next(response.response)
+    response.close()  # client went away after the first chunk
+
+    assert b"event: chunk" in first
+    assert "<count=one >" in history(client, session_id)
+
+
+@pytest.mark.filterwarnings("error::sqlalchemy.exc.SAWarning")
+def test_stream_without_session_id(login, streamed):
+    client = login("al@example.com", name="al")
+
+    body = client.get("/chatbot-stream?message=count").get_data(as_text=True)
+
+    assert body.startswith("event: error")